@@ -21,107 +21,335 @@ Notes:
 """
 
 import argparse
+import heapq
+import http.client
 import json
 import os
 import re
+import signal
+import socket
 import sys
+import threading
 import time
+from collections import deque
 from datetime import timedelta
-from urllib.request import Request, urlopen
+from functools import lru_cache
+from urllib.parse import urljoin, urlsplit
+from urllib.request import Request, getproxies, proxy_bypass, urlopen
 from urllib.error import URLError, HTTPError
 from typing import Any, Dict, List, Optional, Tuple
 
-COUNT_KEYS = {"waiting", "active", "delayed", "paused", "failed", "completed"}
-
-def http_get_json(url: str, api_key: str) -> Any:
+# orjson is optional: it parses bytes directly (no separate decode pass) and is
+# considerably faster on large /api/jobs payloads. Fall back to stdlib json.
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_loads(raw: bytes) -> Any:
+        return json.loads(raw.decode("utf-8", errors="replace"))
+
+COUNT_KEYS = ("waiting", "active", "delayed", "paused", "failed", "completed")
+
+_ROOT_JOBCOUNTS_RE = re.compile(r"^root\.([^.]+)\.jobCounts$")
+_ROOT_PREFIX_RE = re.compile(r"^root\.")
+_JOBCOUNTS_SUFFIX_RE = re.compile(r"\.jobCounts$")
+
+# Set to request a clean stop (e.g. from the SIGTERM handler); the poll loop
+# waits on it between samples so a stop request wakes it immediately.
+_stop = threading.Event()
+
+def _on_sigterm(signum: int, frame: Any) -> None:
+    # Signal handlers run on the main thread, which may be inside _stop.wait()
+    # holding the Event's internal lock; calling _stop.set() here could then
+    # deadlock. Set it from a helper thread, which just waits for the lock.
+    threading.Thread(target=_stop.set, daemon=True).start()
+
+# Keep-alive connection reused across polls (keyed by scheme://host:port) so each
+# sample doesn't pay for a fresh TCP/TLS handshake.
+_CONN: Optional[http.client.HTTPConnection] = None
+_CONN_KEY: Optional[Tuple[str, str]] = None
+
+def _get_conn(scheme: str, netloc: str) -> http.client.HTTPConnection:
+    global _CONN, _CONN_KEY
+    if _CONN is None or _CONN_KEY != (scheme, netloc):
+        if _CONN is not None:
+            _CONN.close()
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        _CONN = cls(netloc, timeout=20)
+        _CONN_KEY = (scheme, netloc)
+    return _CONN
+
+def _drop_conn() -> None:
+    global _CONN, _CONN_KEY
+    if _CONN is not None:
+        _CONN.close()
+    _CONN = None
+    _CONN_KEY = None
+
+_REDIRECT_CODES = (301, 302, 303, 307, 308)
+_PERMANENT_REDIRECT_CODES = (301, 308)
+_MAX_REDIRECTS = 5
+
+# Where a URL permanently redirected to (e.g. http -> https), so later polls go
+# straight there instead of paying for the redirect and a reconnect every time.
+_PERMANENT_REDIRECTS: Dict[str, str] = {}
+
+@lru_cache(maxsize=None)
+def _uses_proxy(scheme: str, host: str) -> bool:
+    """True if HTTP(S)_PROXY / NO_PROXY say this scheme+host goes through a proxy."""
+    return scheme in getproxies() and not proxy_bypass(host)
+
+def _urlopen_get(url: str, api_key: str) -> bytes:
+    # urllib handles proxies (and redirects) itself; no connection reuse here.
     req = Request(url)
     req.add_header("Accept", "application/json")
     req.add_header("x-api-key", api_key)
     with urlopen(req, timeout=20) as resp:
-        raw = resp.read().decode("utf-8", errors="replace")
-        return json.loads(raw)
+        return resp.read()
+
+def _conn_get(url: str, api_key: str) -> Tuple[http.client.HTTPResponse, bytes]:
+    u = urlsplit(url)
+    target = u.path or "/"
+    if u.query:
+        target += "?" + u.query
+    headers = {"Accept": "application/json", "x-api-key": api_key}
+
+    while True:
+        conn = _get_conn(u.scheme, u.netloc)
+        reused = conn.sock is not None
+        try:
+            conn.request("GET", target, headers=headers)
+            resp = conn.getresponse()
+            body = resp.read()
+        except (OSError, http.client.HTTPException) as e:
+            _drop_conn()
+            # Retry once on a fresh connection only if an idle keep-alive
+            # connection went stale; a timeout or a failing new connection is final.
+            if reused and not isinstance(e, socket.timeout):
+                continue
+            raise URLError(e)
+        if resp.will_close:
+            _drop_conn()
+        return resp, body
+
+def http_get_json(url: str, api_key: str) -> Any:
+    start_url = url
+    url = _PERMANENT_REDIRECTS.get(url, url)
+    permanent = True
+
+    for _ in range(_MAX_REDIRECTS + 1):
+        u = urlsplit(url)
+        if _uses_proxy(u.scheme, u.hostname or ""):
+            raw = _urlopen_get(url, api_key)
+            break
+
+        resp, body = _conn_get(url, api_key)
+        location = resp.getheader("Location")
+        if resp.status in _REDIRECT_CODES and location:
+            permanent = permanent and resp.status in _PERMANENT_REDIRECT_CODES
+            url = urljoin(url, location)
+            continue
+        if not 200 <= resp.status < 300:
+            raise HTTPError(url, resp.status, resp.reason, resp.headers, None)
+        raw = body
+        break
+    else:
+        raise HTTPError(url, resp.status, "too many redirects", resp.headers, None)
+
+    if permanent and url != start_url:
+        _PERMANENT_REDIRECTS[start_url] = url
+    return _json_loads(raw)
 
 def is_counts_dict(d: Any) -> bool:
     if not isinstance(d, dict):
         return False
-    hits = COUNT_KEYS.intersection(d.keys())
-    # require at least 2 keys to avoid false positives
-    return len(hits) >= 2 and all(isinstance(d[k], (int, float)) for k in hits if k in d)
-
-def extract_queues(obj: Any, path: str = "root") -> List[Tuple[str, Dict[str, Any]]]:
+    # single pass: every count key present must be numeric, and require at
+    # least 2 of them to avoid false positives
+    hits = 0
+    for k in COUNT_KEYS:
+        if k in d:
+            if not isinstance(d[k], (int, float)):
+                return False
+            hits += 1
+    return hits >= 2
+
+def _join_path(link: Any) -> str:
+    """Rebuild a JSON path like "root.a[0].b" from a (parent_link, segment) chain."""
+    parts: List[str] = []
+    while link is not None:
+        link, seg = link
+        parts.append(seg)
+    parts.reverse()
+    return "".join(parts)
+
+def extract_queues(obj: Any, path: str = "root", max_depth: int = 12) -> List[Tuple[str, Dict[str, Any]]]:
     """
     Walk arbitrary JSON, yielding (queue_name, counts_dict).
     queue_name is best-effort derived from nearby keys or JSON path.
+
+    Iterative (explicit stack) so deep payloads can't hit the recursion limit.
+    Paths are kept as a parent chain and only joined into a string when a
+    counts dict actually needs one as its name.
+    Containers deeper than max_depth are not descended into, and a container
+    reachable through more than one reference is only walked once.
     """
     found: List[Tuple[str, Dict[str, Any]]] = []
+    stack = deque([(obj, (None, path), 0)])
+    visited = set()
+
+    while stack:
+        node, link, depth = stack.pop()
+
+        node_id = id(node)
+        if node_id in visited:
+            continue
+        visited.add(node_id)
+
+        if isinstance(node, dict):
+            if is_counts_dict(node):
+                name = node.get("queue") or node.get("name") or node.get("job") or _join_path(link)
+                found.append((str(name), node))
+                # counts dicts are leaves: their values are the numbers themselves
+                continue
+
+            if depth >= max_depth:
+                continue
+            depth += 1
+
+            # push in reverse so children are visited in document order
+            for k, v in reversed(node.items()):
+                if isinstance(v, (dict, list)):
+                    stack.append((v, (link, "." + str(k)), depth))
+
+        elif isinstance(node, list):
+            if depth >= max_depth:
+                continue
+            depth += 1
+
+            for i in range(len(node) - 1, -1, -1):
+                v = node[i]
+                if isinstance(v, (dict, list)):
+                    stack.append((v, (link, f"[{i}]"), depth))
 
-    if isinstance(obj, dict):
-        if is_counts_dict(obj):
-            name = obj.get("queue") or obj.get("name") or obj.get("job") or path
-            found.append((str(name), obj))
-
-        for k, v in obj.items():
-            child_path = f"{path}.{k}"
-            found.extend(extract_queues(v, child_path))
+    return found
 
-    elif isinstance(obj, list):
-        for i, v in enumerate(obj):
-            found.extend(extract_queues(v, f"{path}[{i}]"))
+def extract_queues_fast(data: Any) -> Optional[List[Tuple[str, Dict[str, Any]]]]:
+    """
+    Fast path for the stock /api/jobs shape: {queue: {"jobCounts": {...}, ...}}.
+    Returns the same (queue_name, counts_dict) pairs extract_queues would, or
+    None if the payload doesn't look like that (caller falls back to the walk).
+    """
+    if not isinstance(data, dict) or not data:
+        return None
+    for v in data.values():
+        if not isinstance(v, dict) or not isinstance(v.get("jobCounts"), dict) or is_counts_dict(v):
+            return None
 
+    found: List[Tuple[str, Dict[str, Any]]] = []
+    for k, v in data.items():
+        c = v["jobCounts"]
+        if is_counts_dict(c):
+            name = c.get("queue") or c.get("name") or c.get("job") or f"root.{k}.jobCounts"
+            found.append((str(name), c))
     return found
 
+def fetch_queues(url: str, api_key: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    GET url and return its (queue_name, counts_dict) pairs.
+    The parsed payload is dropped as soon as the walk is done, so only the
+    counts dicts stay referenced while the loop sleeps.
+    """
+    data = http_get_json(url, api_key)
+    queues = extract_queues_fast(data)
+    if queues is None:
+        queues = extract_queues(data)
+    return queues
+
+@lru_cache(maxsize=512)
 def normalize_queue_name(name: str) -> str:
     """
     Make names readable: your output looked like "root.metadataExtraction.jobCounts"
     We try to extract the meaningful middle.
+    Cached: the same raw paths come back on every poll.
     """
     n = name
 
-    # Common pattern: root.<queue>.jobCounts
-    m = re.match(r"^root\.([^.]+)\.jobCounts$", n)
+    # Common pattern: root.<queue>.jobCounts (plain slicing when there's no extra dot)
+    if n.startswith("root.") and n.endswith(".jobCounts"):
+        mid = n[5:-10]
+        if mid and "." not in mid:
+            return mid
+
+    m = _ROOT_JOBCOUNTS_RE.match(n)
     if m:
         return m.group(1)
 
     # Strip common prefixes
-    n = re.sub(r"^root\.", "", n)
+    n = _ROOT_PREFIX_RE.sub("", n)
 
     # Strip noisy suffixes
-    n = re.sub(r"\.jobCounts$", "", n)
+    n = _JOBCOUNTS_SUFFIX_RE.sub("", n)
 
     return n
 
-def summarize(queues: List[Tuple[str, Dict[str, Any]]]) -> Tuple[Dict[str, int], Dict[str, int]]:
+class Totals:
+    """Job counts summed across all queues for one sample."""
+    __slots__ = ("pending", "failed", "active", "waiting", "delayed", "paused")
+
+    def __init__(self, pending: int = 0, failed: int = 0, active: int = 0,
+                 waiting: int = 0, delayed: int = 0, paused: int = 0) -> None:
+        self.pending = pending  # waiting + active + delayed + paused
+        self.failed = failed
+        self.active = active
+        self.waiting = waiting
+        self.delayed = delayed
+        self.paused = paused
+
+def summarize(queues: List[Tuple[str, Dict[str, Any]]]) -> Tuple[Dict[str, int], Totals]:
     """
     queues: list of (name, counts_dict)
     Return:
       per_queue_pending: dict[name] = pending
-      totals: dict
+      totals: Totals
     """
     per_queue_pending: Dict[str, int] = {}
-    totals = {"pending": 0, "failed": 0, "active": 0, "waiting": 0, "delayed": 0, "paused": 0}
+    t_failed = t_active = t_waiting = t_delayed = t_paused = 0
+    normalize = normalize_queue_name
 
     for raw_name, c in queues:
-        name = normalize_queue_name(raw_name)
+        name = normalize(raw_name)
 
-        waiting = int(c.get("waiting", 0) or 0)
-        active  = int(c.get("active", 0) or 0)
-        delayed = int(c.get("delayed", 0) or 0)
-        paused  = int(c.get("paused", 0) or 0)
-        failed  = int(c.get("failed", 0) or 0)
+        # values already passed is_counts_dict's numeric check; None/missing -> 0.
+        # Truncate each count on its own so pending always equals the sum of the
+        # parts shown (floats are accepted by is_counts_dict).
+        get = c.get
+        waiting = int(get("waiting") or 0)
+        active  = int(get("active") or 0)
+        delayed = int(get("delayed") or 0)
+        paused  = int(get("paused") or 0)
 
         pending = waiting + active + delayed + paused
 
         # Deduplicate: if we see the same queue name multiple times via different paths,
         # keep the maximum pending (most conservative).
-        per_queue_pending[name] = max(per_queue_pending.get(name, 0), pending)
-
-        totals["pending"] += pending
-        totals["failed"] += failed
-        totals["active"] += active
-        totals["waiting"] += waiting
-        totals["delayed"] += delayed
-        totals["paused"] += paused
-
+        prev = per_queue_pending.get(name)
+        if prev is None or pending > prev:
+            per_queue_pending[name] = pending
+
+        t_failed += int(get("failed") or 0)
+        t_active += active
+        t_waiting += waiting
+        t_delayed += delayed
+        t_paused += paused
+
+    totals = Totals(
+        pending=t_waiting + t_active + t_delayed + t_paused,
+        failed=t_failed,
+        active=t_active,
+        waiting=t_waiting,
+        delayed=t_delayed,
+        paused=t_paused,
+    )
     return per_queue_pending, totals
 
 def human_td(seconds: float) -> str:
@@ -141,6 +369,45 @@ def ema_update(prev: Optional[float], inst: float, alpha: float) -> float:
         return inst
     return alpha * inst + (1 - alpha) * prev
 
+class QueueState:
+    """Per-queue rate state carried between samples."""
+    __slots__ = ("prev", "seen", "ema", "drained", "prefix")
+
+    def __init__(self, name: str) -> None:
+        self.prev = 0       # pending at the last sample this queue was seen
+        self.seen = 0       # iteration of that sample (0 = never)
+        self.ema: Optional[float] = None  # rate/sec
+        self.drained = 0    # drained since the previous sample
+        self.prefix = f"    - {name}: "  # output line prefix, built once
+
+def update_queue_rates(q_state: Dict[str, QueueState], perq: Dict[str, int],
+                       elapsed: Optional[float], alpha: float, iteration: int) -> None:
+    """
+    Advance drain/EMA state for every queue in one pass.
+    elapsed is None on the baseline sample (no rate yet).
+    The EMA step is inlined (same math as ema_update) to avoid a call per queue.
+    """
+    keep = 1 - alpha
+    for qname, qpending in perq.items():
+        st = q_state.get(qname)
+        if st is None:
+            st = q_state[qname] = QueueState(qname)
+
+        if elapsed is not None:
+            # if queue wasn't in the previous sample, assume no delta
+            drained = st.prev - qpending if st.seen == iteration - 1 else 0
+            inst = drained / elapsed
+            st.drained = drained
+            prev_ema = st.ema
+            st.ema = inst if prev_ema is None else alpha * inst + keep * prev_ema
+
+        # If queue is empty, force EMA to 0 to avoid "sticky" non-zero rates/ETAs
+        if qpending <= 0:
+            st.ema = 0.0
+
+        st.prev = qpending
+        st.seen = iteration
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--base-url", default="http://127.0.0.1:2283/api", help="Immich base URL ending in /api")
@@ -177,22 +444,41 @@ def main():
 
     prev_ts: Optional[float] = None
     prev_total_pending: Optional[int] = None
-    prev_perq: Dict[str, int] = {}
 
     # Rate trackers (per second)
     ema_total_rate: Optional[float] = None
-    ema_queue_rate: Dict[str, float] = {}  # queue -> rate/sec
+    q_state: Dict[str, QueueState] = {}
 
     drained_since_start_total = 0
 
+    # Interval math uses the monotonic clock (immune to NTP/wall-clock jumps);
+    # samples are scheduled on a fixed grid from the first poll so they don't drift.
+    next_ts: Optional[float] = None
+
+    # Hot names bound once as locals for the polling loop
+    interval = args.interval
+    samples = args.samples
+    remaining = args.remaining
+    top_n = args.top
+    alpha = args.ema_alpha
+    focus = args.focus
+    show_critical_path = args.show_critical_path
+    monotonic = time.monotonic
+    strftime = time.strftime
+    stop_wait = _stop.wait
+    ema_update_fn = ema_update
+
+    signal.signal(signal.SIGTERM, _on_sigterm)
+
     iteration = 0
     while True:
         iteration += 1
-        t_query_start = time.time()
+        if next_ts is None:
+            next_ts = monotonic()
 
-        # Fetch jobs JSON
+        # Fetch jobs JSON and pull out the queue counts
         try:
-            data = http_get_json(jobs_url, api_key)
+            queues = fetch_queues(jobs_url, api_key)
         except HTTPError as e:
             print(f"HTTP error {e.code}: {e.reason}", file=sys.stderr)
             sys.exit(1)
@@ -203,13 +489,12 @@ def main():
             print(f"Error reading/parsing JSON: {e}", file=sys.stderr)
             sys.exit(1)
 
-        queues = extract_queues(data)
         perq, totals = summarize(queues)
 
-        now = time.time()
-        stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        now = monotonic()
+        stamp = strftime("%Y-%m-%d %H:%M:%S")
 
-        total_pending = totals["pending"]
+        total_pending = totals.pending
 
         if start_ts is None:
             start_ts = now
@@ -226,7 +511,10 @@ def main():
             inst_total_rate = inst_total_drained / elapsed
             drained_since_start_total += inst_total_drained
 
-            ema_total_rate = ema_update(ema_total_rate, inst_total_rate, args.ema_alpha)
+            ema_total_rate = ema_update_fn(ema_total_rate, inst_total_rate, alpha)
+
+        update_queue_rates(q_state, perq, elapsed if prev_ts is not None else None,
+                           alpha, iteration)
 
         # Running average rate
         total_elapsed_since_start = max(1e-6, now - (start_ts or now))
@@ -235,17 +523,20 @@ def main():
             avg_total_drained = (start_total_pending - total_pending)
             avg_total_rate = avg_total_drained / total_elapsed_since_start
 
+        # Lines for this sample are buffered and written in one go at the end
+        out: List[str] = []
+
         # Header line
         header = (
             f"[{stamp}] total pending={total_pending:,} "
-            f"(waiting={totals['waiting']:,}, active={totals['active']:,}, delayed={totals['delayed']:,}, paused={totals['paused']:,}) "
-            f"failed={totals['failed']:,}"
+            f"(waiting={totals.waiting:,}, active={totals.active:,}, delayed={totals.delayed:,}, paused={totals.paused:,}) "
+            f"failed={totals.failed:,}"
         )
-        print(header)
+        out.append(header)
 
         # Rate line (only after we have at least two samples)
         if prev_ts is not None:
-            print(
+            out.append(
                 f"  Δ total={fmt_delta(-inst_total_drained)} pending  "
                 f"drained={fmt_delta(inst_total_drained)} in {elapsed:.1f}s  "
                 f"inst={fmt_rate_per_hr(inst_total_rate)}  "
@@ -253,21 +544,22 @@ def main():
                 f"avg={fmt_rate_per_hr(avg_total_rate)}"
             )
         else:
-            print("  (collecting baseline sample for rate/ETA...)")
+            out.append("  (collecting baseline sample for rate/ETA...)")
 
         # ETA (total)
         if prev_ts is not None and (ema_total_rate or 0) > 0:
-            numerator = args.remaining if args.remaining is not None else total_pending
+            numerator = remaining if remaining is not None else total_pending
             eta_sec = numerator / (ema_total_rate or 1e-9)
-            label = "override remaining" if args.remaining is not None else "total pending"
-            print(f"  ETA ({label}, using EMA): ~{human_td(eta_sec)}")
+            label = "override remaining" if remaining is not None else "total pending"
+            out.append(f"  ETA ({label}, using EMA): ~{human_td(eta_sec)}")
         # Critical-path ETA: max per-queue ETA among non-zero queues (EMA-based)
-        if args.show_critical_path and prev_ts is not None:
+        if show_critical_path and prev_ts is not None:
             worst = None  # (eta_seconds, qname, pending, rate)
             for qname, qpending in perq.items():
                 if qpending <= 0:
                     continue
-                q_ema = ema_queue_rate.get(qname)
+                st = q_state.get(qname)
+                q_ema = st.ema if st is not None else None
                 if q_ema is None or q_ema <= 0:
                     continue
                 q_eta = qpending / q_ema
@@ -276,70 +568,59 @@ def main():
 
             if worst:
                 q_eta, qname, qpending, q_ema = worst
-                print(f"  ETA (critical path: {qname}, using EMA): ~{human_td(q_eta)}  (pending={qpending:,}, rate={fmt_rate_per_hr(q_ema)})")
+                out.append(f"  ETA (critical path: {qname}, using EMA): ~{human_td(q_eta)}  (pending={qpending:,}, rate={fmt_rate_per_hr(q_ema)})")
 
         elif prev_ts is not None:
-            print("  ETA: n/a (rate <= 0)")
+            out.append("  ETA: n/a (rate <= 0)")
 
         # Per-queue breakdown: top queues by current pending
-        #topq = sorted(perq.items(), key=lambda x: x[1], reverse=True)[:args.top]
-        topq = sorted(perq.items(), key=lambda x: x[1], reverse=True)
-        if args.focus:
+        if focus:
             # Move focused queue to the top if present
-            topq = sorted(topq, key=lambda x: (0 if x[0] == args.focus else 1, -x[1]))
-        topq = topq[:args.top]
+            topq = heapq.nlargest(top_n, perq.items(), key=lambda x: (x[0] == focus, x[1]))
+        else:
+            topq = heapq.nlargest(top_n, perq.items(), key=lambda x: x[1])
 
         if topq:
-            print("  Queues (top by pending):")
+            out.append("  Queues (top by pending):")
             for qname, qpending in topq:
-                # Compute queue-specific drain and rate
-                q_inst_rate = None
-                q_inst_drained = None
-                if prev_ts is not None:
-                    prev_q = prev_perq.get(qname, qpending)  # if new queue appears, assume no delta
-                    q_inst_drained = prev_q - qpending
-                    q_inst_rate = q_inst_drained / max(1e-6, elapsed)
-
-                    # Update queue EMA
-                    prev_ema = ema_queue_rate.get(qname)
-                    ema_queue_rate[qname] = ema_update(prev_ema, q_inst_rate, args.ema_alpha)
-                
-                # If queue is empty, force EMA to 0 to avoid "sticky" non-zero rates/ETAs
-                if qpending <= 0:
-                    ema_queue_rate[qname] = 0.0
-              
-                # Print queue line
+                st = q_state[qname]
                 if prev_ts is None:
-                    print(f"    - {qname}: pending={qpending:,}")
+                    out.append(f"{st.prefix}pending={qpending:,}")
                 else:
-                    q_ema = ema_queue_rate.get(qname, 0.0)
+                    q_ema = st.ema or 0.0
                     # ETA per queue (using EMA)
                     if q_ema > 0:
                         q_eta = qpending / q_ema
                         eta_str = f"ETA ~{human_td(q_eta)}"
                     else:
                         eta_str = "ETA n/a"
-                    print(
-                        f"    - {qname}: pending={qpending:,}  "
-                        f"drained={fmt_delta(q_inst_drained or 0)}  "
+                    out.append(
+                        f"{st.prefix}pending={qpending:,}  "
+                        f"drained={fmt_delta(st.drained)}  "
                         f"ema={fmt_rate_per_hr(q_ema)}  "
                         f"{eta_str}"
                     )
 
-        print()
+        sys.stdout.write("\n".join(out))
+        sys.stdout.write("\n\n")
+        sys.stdout.flush()
 
         # Update previous snapshot
         prev_ts = now
         prev_total_pending = total_pending
-        prev_perq = perq
 
         # Stop condition
-        if args.samples != 0 and iteration >= args.samples:
+        if samples != 0 and iteration >= samples:
             break
 
-        # Sleep until next interval (accounting for query time)
-        query_elapsed = time.time() - t_query_start
-        time.sleep(max(0.0, args.interval - query_elapsed))
+        # Sleep until the next scheduled sample; if we overran (slow query,
+        # suspend), re-anchor instead of firing a burst of catch-up samples.
+        next_ts += interval
+        t_now = monotonic()
+        if next_ts < t_now:
+            next_ts = t_now
+        if stop_wait(next_ts - t_now):
+            break
 
 if __name__ == "__main__":
     main()